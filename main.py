@@ -8,8 +8,10 @@ if str(BASE_DIR) not in sys.path:
 
 import asyncio
 import json
-from s3_usage_collector.data.config import CustomConfig
+import multiprocessing
+from s3_usage_collector.data.config import CustomConfig, load_clusters
 from s3_usage_collector.tasks.usage import UsageCollector
+from s3_usage_collector.utils.params import to_bool
 
 
 def get_params() -> dict:
@@ -37,19 +39,62 @@ async def main():
     s3_usage_period_seconds = params.get('S3_USAGE_PERIOD', 3600)
     remove_items = params.get('S3_REMOVE_STATS_ITEMS', False)
     save_chunks = params.get('S3_SAVE_STATS_CHUNKS', False)
+    concurrency = params.get('S3_CONCURRENCY', 12)
+    usage_slots = int(params.get('S3_USAGE_SLOTS', 0))
+
+    clusters_file = params.get('S3_CLUSTERS_FILE', None)
+    tag_clusters = params.get('S3_TAG_CLUSTERS', False)
+    cluster_timeout = params.get('S3_CLUSTER_TIMEOUT', None)
 
     result_dir = params.get('RESULTS_DIR', None)
     chunks_dir = params.get('STATS_CHUNKS_DIR', None)
     backup_dir = params.get('USAGE_BACKUP_DIR', None)
     usage_summary_file = params.get('USAGE_SUMMARY_FILE', None)
+    output_formats = params.get('OUTPUT_FORMATS', None)
+    quiet = to_bool(params.get('QUIET', False))
+    save_delta = to_bool(params.get('USAGE_DELTA', False))
+    profile = to_bool(params.get('PROFILE', False))
+
+    mode = params.get('MODE', 'COLLECT').upper()
+    replay_from = params.get('REPLAY_FROM', None)
+    replay_to = params.get('REPLAY_TO', None)
+    replay_workers = params.get('REPLAY_WORKERS', None)
+
+    query_api_port = params.get('QUERY_API_PORT', None)
+    query_api_host = params.get('QUERY_API_HOST', '127.0.0.1')
+    query_api_linger = int(params.get('QUERY_API_LINGER', 0))
 
     settings = CustomConfig(
         result_dir=result_dir,
         chunks_dir=chunks_dir,
         backup_dir=backup_dir,
-        usage_summary_file=usage_summary_file
+        usage_summary_file=usage_summary_file,
+        output_formats=output_formats.split(',') if output_formats else None,
+        save_delta=save_delta,
     )
 
+    if mode == 'REPLAY':
+        # Replay and query API modules are imported only when they are used
+        from s3_usage_collector.tasks.replay import ReplayCollector, parse_replay_datetime
+
+        replay = ReplayCollector(
+            settings=settings,
+            start=parse_replay_datetime(replay_from),
+            end=parse_replay_datetime(replay_to),
+            workers=int(replay_workers) if replay_workers else None,
+            tag_clusters=tag_clusters,
+            summary_only=quiet,
+            usage_period_seconds=int(s3_usage_period_seconds),
+            usage_slots=usage_slots,
+        )
+        results = await replay.replay()
+
+        json.dump(results, sys.stdout, indent=4)
+        print()
+        return
+
+    clusters = load_clusters(clusters_file) if clusters_file else None
+
     s3_client = UsageCollector(
         access_key=access_key,
         secret_key=secret_key,
@@ -58,11 +103,42 @@ async def main():
         s3_usage_period_seconds=int(s3_usage_period_seconds),
         remove_items=remove_items,
         save_chunks=save_chunks,
+        clusters=clusters,
+        tag_clusters=tag_clusters,
+        cluster_timeout_seconds=int(cluster_timeout) if cluster_timeout else None,
+        concurrency=int(concurrency),
+        summary_only=quiet,
+        profile=profile,
+        usage_slots=usage_slots,
     )
 
-    results = await s3_client.ostor_usage()
+    query_server = None
+    if query_api_port:
+        from s3_usage_collector.api.query_server import QueryServer
+
+        query_server = QueryServer(s3_client, host=query_api_host, port=int(query_api_port))
+        await query_server.start()
+
+    try:
+        results = await s3_client.ostor_usage()
+
+        # json.dump writes chunk by chunk, without building one big string
+        json.dump(results, sys.stdout, indent=4)
+        print()
+        sys.stdout.flush()
+
+        if query_server and query_api_linger:
+            # Keep serving the last aggregate; negative QUERY_API_LINGER - until stopped
+            if query_api_linger < 0:
+                await asyncio.Event().wait()
+            await asyncio.sleep(query_api_linger)
 
-    print(json.dumps(results, indent=4))
+    finally:
+        if query_server:
+            await query_server.close()
 
 if __name__ == "__main__":
+    # In a frozen build replay workers start this executable with --multiprocessing-fork,
+    # freeze_support() runs the worker and exits before the params are parsed
+    multiprocessing.freeze_support()
     asyncio.run(main())
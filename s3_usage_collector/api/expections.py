@@ -1,7 +1,9 @@
-from typing import Optional
-from curl_cffi.requests import Response
+from typing import TYPE_CHECKING, Optional
 import xml.etree.ElementTree as ET
 
+if TYPE_CHECKING:
+    from curl_cffi.requests import Response
+
 
 def xml_to_dict(xml_string: str) -> dict:
         def _recurse(node):
@@ -17,7 +19,7 @@ class HTTPException(Exception):
     response: dict | None
     status_code: int | None
 
-    def __init__(self, response: Response | None = None) -> None:
+    def __init__(self, response: "Response | None" = None) -> None:
 
         self.response = response
         self.status_code = response.status_code
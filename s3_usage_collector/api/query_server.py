@@ -0,0 +1,159 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from s3_usage_collector.utils.log import logger
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+# Request counters in /status are kept for these routes, everything else is counted as 'unknown'
+ROUTES = ('status', 'users', 'buckets', 'top')
+
+
+class QueryServer:
+    """
+    Minimal HTTP/1.1 JSON API in the collector's event loop:
+
+        GET /status                         run status and API metrics
+        GET /users/{user_id}                rows of the user, via user -> buckets index
+        GET /buckets/{bucket}               rows of the bucket, via bucket -> users index
+        GET /top?counter=ops.get&n=10       top rows by a flattened counter
+    """
+    __module__ = 'S3 Usage Query API'
+
+    def __init__(self, collector, host: str = '127.0.0.1', port: int = 8080, request_timeout: int = 10):
+        self.collector = collector
+        self.cache = collector.cache
+        self.index = self.cache.enable_query_index()
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.started_at: Optional[str] = None
+        self.requests: dict[str, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.started_at = datetime.utcnow().isoformat()
+        logger.info(f"[{self.__module__}] | Listening on http://{self.host}:{self.port}")
+
+    async def close(self):
+        if self._server is not None:
+            server, self._server = self._server, None
+            server.close()
+            await server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=self.request_timeout)
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+            # Headers are not used, only drained
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=self.request_timeout)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            status, body = self.dispatch(method, target)
+
+        except Exception as e:
+            status, body = 400, {"error": f"Bad request: {e}"}
+
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+
+        try:
+            writer.write(head.encode() + payload)
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except Exception as e:
+            logger.debug(f"[{self.__module__}] | Failed to send response | {e}")
+
+    def dispatch(self, method: str, target: str) -> tuple[int, dict]:
+        if method != 'GET':
+            return 405, {"error": f"Method {method} is not allowed"}
+
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        route = parts[0] if parts else ''
+        metric = route if route in ROUTES else 'unknown'
+        self.requests[metric] = self.requests.get(metric, 0) + 1
+
+        try:
+            if parts == ['status']:
+                return 200, self.status()
+            if route == 'users' and len(parts) == 2:
+                return self.user_usage(parts[1])
+            if route == 'buckets' and len(parts) == 2:
+                return self.bucket_usage(parts[1])
+            if parts == ['top']:
+                return self.top(query.get('counter'), query.get('n', '10'))
+
+        except Exception as e:
+            logger.error(f"[{self.__module__}] | Failed to handle {target} | {e}")
+            return 500, {"error": str(e)}
+
+        return 404, {"error": f"Unknown path {url.path}"}
+
+    def status(self) -> dict:
+        return {
+            "run": self.collector.run_status,
+            "rows": len(self.cache.usage_aggregate),
+            "users": len(self.index.user_buckets),
+            "buckets": len(self.index.bucket_users),
+            "counters": sorted(self.index.counters),
+            "api": {
+                "started_at": self.started_at,
+                "requests": self.requests,
+            },
+        }
+
+    def user_usage(self, user_id: str) -> tuple[int, dict]:
+        buckets = self.index.buckets_of(user_id)
+        if not buckets:
+            return 404, {"error": f"No usage for user_id '{user_id}'"}
+
+        rows = [self.cache.usage_row(bucket, user_id) for bucket in sorted(buckets)]
+        return 200, {"user_id": user_id, "summarized_data": [row for row in rows if row]}
+
+    def bucket_usage(self, bucket: str) -> tuple[int, dict]:
+        users = self.index.users_of(bucket)
+        if not users:
+            return 404, {"error": f"No usage for bucket '{bucket}'"}
+
+        rows = [self.cache.usage_row(bucket, user_id) for user_id in sorted(users)]
+        return 200, {"bucket": bucket, "summarized_data": [row for row in rows if row]}
+
+    def top(self, counter: Optional[str], n: str) -> tuple[int, dict]:
+        if not counter:
+            return 400, {"error": "Query parameter 'counter' is required, e.g. counter=ops.get"}
+        if counter not in self.index.counters:
+            return 404, {"error": f"Unknown counter '{counter}'"}
+
+        try:
+            limit = max(0, int(n))
+        except ValueError:
+            return 400, {"error": f"Invalid n '{n}'"}
+
+        keys = self.index.top(self.cache.usage_aggregate, counter, limit)
+        return 200, {
+            "counter": counter,
+            "summarized_data": [self.cache.usage_row(bucket, user_id) for bucket, user_id in keys],
+        }
@@ -2,19 +2,37 @@ import base64
 import hmac
 import hashlib
 import email.utils
-
-from curl_cffi.requests import AsyncSession
+from typing import TYPE_CHECKING
 
 from s3_usage_collector.api.expections import HTTPException
 from urllib.parse import urlencode, urlparse
-from loguru import logger
+from s3_usage_collector.utils.log import logger
+
+if TYPE_CHECKING:
+    from curl_cffi.requests import AsyncSession
 
 
 class S3Client:
-    def __init__(self, access_key: str, secret_key: str, endpoint: str):
+    def __init__(self, access_key: str, secret_key: str, endpoint: str, max_clients: int = 10):
         self.access_key = access_key
         self.secret_key = secret_key.encode()
         self.endpoint = endpoint.rstrip("/")
+        self.max_clients = max_clients
+        self._session: "AsyncSession | None" = None
+
+    def _get_session(self) -> "AsyncSession":
+        # One connection pool per endpoint, reused between requests.
+        # curl_cffi is imported here, on the first request, not at import time
+        if self._session is None:
+            from curl_cffi.requests import AsyncSession
+
+            self._session = AsyncSession(max_clients=self.max_clients)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
 
     def _make_headers(self, method: str, canonical_path: str):
         s3_date = email.utils.formatdate(usegmt=True)
@@ -48,23 +66,26 @@ class S3Client:
 
         headers = self._make_headers(method, path)
 
-        async with AsyncSession() as session:
-            try:
-                response = await session.request(method=method, url=url, headers=headers, timeout=20)
-                status_code = response.status_code
-                content_type = response.headers.get("content-type", "")
-                if status_code <= 204:
+        session = self._get_session()
+
+        try:
+            response = await session.request(method=method, url=url, headers=headers, timeout=20)
+            status_code = response.status_code
+            content_type = response.headers.get("content-type", "")
+            if status_code <= 204:
 
-                    if "application/json" in content_type:
-                        return response.json()
+                if "application/json" in content_type:
+                    return response.json()
 
-                    return response.text
+                return response.text
 
-                else:
-                    raise HTTPException(response=response)
+            else:
+                raise HTTPException(response=response)
 
-            except Exception as e:
-                logger.exception(e)
+        except Exception as e:
+            # Callers report the failure (object, cluster), so it must not turn into None here
+            logger.exception(e)
+            raise
 
     async def get_ostor_usage(self, obj: str | None = None):
         path = '/?ostor-usage'
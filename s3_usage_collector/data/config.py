@@ -1,14 +1,7 @@
-import asyncio
+import json
 from pathlib import Path
 import sys
-from loguru import logger
-from dotenv import load_dotenv
 import os
-from asyncio import Semaphore
-
-load_dotenv()
-
-semaphore = Semaphore(12)
 
 ### APP CONFIG ###
 
@@ -18,10 +11,34 @@ if getattr(sys, 'frozen', False):
 else:
     ROOT_DIR = Path(__file__).parent.parent.absolute()
 
-class Config:
-    S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
-    S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
-    S3_ENDPOINT = os.getenv("S3_ENDPOINT")
+class _EnvConfig:
+    """
+    S3 settings from the environment, .env is loaded on first access instead of at import time.
+    """
+    _dotenv_loaded = False
+
+    def _getenv(self, name: str):
+        if not _EnvConfig._dotenv_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _EnvConfig._dotenv_loaded = True
+        return os.getenv(name)
+
+    @property
+    def S3_ACCESS_KEY(self):
+        return self._getenv("S3_ACCESS_KEY")
+
+    @property
+    def S3_SECRET_KEY(self):
+        return self._getenv("S3_SECRET_KEY")
+
+    @property
+    def S3_ENDPOINT(self):
+        return self._getenv("S3_ENDPOINT")
+
+
+Config = _EnvConfig()
 
 #DIRECTORY FOR PATTERN DIRECTORY
 if getattr(sys, "frozen", False):
@@ -38,6 +55,9 @@ STATS_CHUNKS_DIR    = os.path.join(ROOT_DIR, 'results', 'stats', 'chunks')
 # USAGE_SUMMARY_FILE NAME, default:  summarized_data.json
 USAGE_SUMMARY_FILE  = os.path.join(RESULTS_DIR, 'summarized_data.json')
 
+# Compact index of the previous run aggregate, used for delta output
+USAGE_INDEX_FILE_NAME = 'usage_index.json'
+
 # USAGE_BACKUP_DIR for backups, {USAGE_SUMMARY_FILE}-{datetime}.json
 USAGE_BACKUP_DIR    = os.path.join(ROOT_DIR, 'backups')
 
@@ -45,7 +65,19 @@ FILES_DIR = os.path.join(ROOT_DIR, 'logs')
 LOG_FILE = os.path.join(FILES_DIR, 'log.log')
 ERRORS_FILE = os.path.join(FILES_DIR, 'errors.log')
 
-lock = asyncio.Lock()
+# semaphore / lock are created on first use (module __getattr__), not at import time
+_shared: dict = {}
+
+
+def __getattr__(name: str):
+    if name not in ('semaphore', 'lock'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    if name not in _shared:
+        import asyncio
+
+        _shared[name] = asyncio.Semaphore(12) if name == 'semaphore' else asyncio.Lock()
+    return _shared[name]
 
 
 class CustomConfig:
@@ -53,11 +85,52 @@ class CustomConfig:
                  result_dir = None,
                  chunks_dir = None,
                  backup_dir = None,
-                 usage_summary_file = None):
+                 usage_summary_file = None,
+                 output_formats = None,
+                 save_delta = False):
         self.result_dir = result_dir if result_dir else RESULTS_DIR
         self.chunks_dir = chunks_dir if chunks_dir else STATS_CHUNKS_DIR
         self.backup_dir = backup_dir if backup_dir else USAGE_BACKUP_DIR
         self.usage_summary_file = os.path.join(self.result_dir, usage_summary_file) if usage_summary_file else USAGE_SUMMARY_FILE
+        # Extra files next to USAGE_SUMMARY_FILE: ndjson, csv, parquet
+        self.output_formats = [fmt.strip().lower() for fmt in output_formats if fmt.strip()] if output_formats else []
+        # Delta against the previous run: {USAGE_SUMMARY_FILE}_delta.json + compact index of the last aggregate
+        self.save_delta = save_delta
+        self.usage_delta_file = f"{os.path.splitext(self.usage_summary_file)[0]}_delta.json"
+        self.usage_index_file = os.path.join(self.result_dir, USAGE_INDEX_FILE_NAME)
+
+    def __repr__(self):
+        return f"Result Dir: {self.result_dir} | Chunks Dir: {self.chunks_dir } | BackUp Dir: {self.backup_dir} | Usage File Name: {self.usage_summary_file}"
+
+class ClusterConfig:
+    def __init__(self,
+                 name: str,
+                 access_key: str,
+                 secret_key: str,
+                 host: str,
+                 concurrency: int = 12):
+        self.name = name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.host = host
+        self.concurrency = int(concurrency)
 
     def __repr__(self):
-        return f"Result Dir: {self.result_dir} | Chunks Dir: {self.chunks_dir } | BackUp Dir: {self.backup_dir} | Usage File Name: {self.usage_summary_file}"
\ No newline at end of file
+        return f"Cluster: {self.name} | Host: {self.host} | Concurrency: {self.concurrency}"
+
+
+def load_clusters(path: str) -> list[ClusterConfig]:
+    """
+    Reads cluster list from json file:
+    [{"name": "...", "access_key": "...", "secret_key": "...", "host": "...", "concurrency": 12}, ...]
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    clusters = [ClusterConfig(**item) for item in data]
+
+    names = [cluster.name for cluster in clusters]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate cluster names in '{path}': {names}")
+
+    return clusters
@@ -0,0 +1,198 @@
+import asyncio
+import copy
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+from s3_usage_collector.utils.log import logger
+from s3_usage_collector.data.config import CustomConfig
+from s3_usage_collector.utils.lists import split_list
+from s3_usage_collector.utils.params import to_bool
+from s3_usage_collector.utils.upload_cache import UploadCache
+from s3_usage_collector.utils.usage_items import iter_usage_items, parse_timestamp_from_object_name
+from s3_usage_collector.utils.usage_series import UsageSeries
+
+# Replay backups go to a subdirectory of USAGE_BACKUP_DIR, apart from the regular runs
+REPLAY_BACKUP_DIR_NAME = 'replay'
+
+
+def parse_replay_datetime(value: Optional[str]) -> Optional[datetime]:
+    """
+    '2024-01-01', '2024-01-01T10:00:00Z' -> naive UTC datetime, as parsed from object names
+    """
+    if not value:
+        return None
+
+    dt = datetime.fromisoformat(value.strip())
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _read_chunk(path: str) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data:
+        raise ValueError("empty chunk file")
+
+    return json.loads(data)
+
+
+def _replay_chunks(chunks: list[tuple[str, Optional[str], datetime]], slot_seconds: int = 0) -> tuple[dict, list[str]]:
+    """
+    Worker: reads a batch of chunk files and returns their partial aggregate
+    {(bucket, user_id, cluster, slot): counters} together with the failed paths.
+    slot is None unless slot_seconds is set (time-bucketed mode).
+    """
+    aggregate: dict = {}
+    failed: list[str] = []
+
+    for path, cluster, ts in chunks:
+        try:
+            usage = _read_chunk(path)
+        except Exception:
+            failed.append(path)
+            continue
+
+        slot = UsageSeries.slot_of(ts, slot_seconds) if slot_seconds else None
+
+        for bucket, user_id, counters in iter_usage_items(usage.get("items") or []):
+            key = (bucket, user_id, cluster, slot)
+            if key not in aggregate:
+                aggregate[key] = json.loads(json.dumps(counters))
+            else:
+                UploadCache._merge_counters(aggregate[key], counters)
+
+    return aggregate, failed
+
+
+class ReplayCollector:
+    """
+    Rebuilds the usage summary from chunks saved with S3_SAVE_STATS_CHUNKS=TRUE, without S3 requests.
+
+    Backups are written to {backup_dir}/replay/ and the delta is never computed, so a replay
+    does not change the backups and the usage index the regular runs compare against.
+    """
+    __module__ = 'S3 Usage Replay'
+
+    def __init__(self,
+                 settings: Optional[CustomConfig] = None,
+                 start: Optional[datetime] = None,
+                 end: Optional[datetime] = None,
+                 workers: Optional[int] = None,
+                 tag_clusters: bool = False,
+                 summary_only: bool = False,
+                 usage_period_seconds: int = 3600,
+                 usage_slots: int = 0,
+                 ):
+        settings = settings if settings else CustomConfig()
+        self.settings = copy.copy(settings)
+        self.settings.backup_dir = os.path.join(settings.backup_dir, REPLAY_BACKUP_DIR_NAME)
+        self.settings.save_delta = False
+        self.start = start
+        self.end = end
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.tag_clusters = to_bool(tag_clusters)
+        self.summary_only = to_bool(summary_only)
+        self.cache = UploadCache(settings=self.settings)
+        if usage_slots:
+            self.cache.enable_usage_series(period_seconds=usage_period_seconds, slots=usage_slots)
+
+    def _list_chunks(self) -> list[tuple[str, str, Optional[str]]]:
+        """
+        (object_name, path, cluster): chunks of several clusters are stored in subdirectories.
+        """
+        chunks = []
+        chunks_dir = self.settings.chunks_dir
+
+        if not os.path.isdir(chunks_dir):
+            logger.warning(f"[{self.__module__}] | Chunks dir '{chunks_dir}' does not exist")
+            return chunks
+
+        with os.scandir(chunks_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    with os.scandir(entry.path) as cluster_entries:
+                        for cluster_entry in cluster_entries:
+                            if cluster_entry.is_file() and cluster_entry.name.endswith('.json'):
+                                chunks.append((cluster_entry.name[:-5], cluster_entry.path, entry.name))
+
+                elif entry.is_file() and entry.name.endswith('.json'):
+                    chunks.append((entry.name[:-5], entry.path, None))
+
+        return chunks
+
+    def _filter_chunks(self, chunks: list[tuple[str, str, Optional[str]]]) -> list[tuple[str, Optional[str], datetime]]:
+        selected = []
+
+        for obj_name, path, cluster in chunks:
+            ts = parse_timestamp_from_object_name(obj_name)
+            if ts is None:
+                continue
+            if self.start and ts < self.start:
+                continue
+            if self.end and ts >= self.end:
+                continue
+            selected.append((path, cluster, ts))
+
+        logger.info(
+            f"[{self.__module__}] | Selected chunks: {len(selected)} of {len(chunks)} "
+            f"(from={self.start}, to={self.end})"
+        )
+        return selected
+
+    async def replay(self) -> dict:
+        try:
+            self.cache.reset_usage_aggregate()
+
+            chunks = self._list_chunks()
+            selected = self._filter_chunks(chunks)
+
+            failed: list[str] = []
+
+            if selected:
+                batch_size = max(1, len(selected) // (self.workers * 4))
+                batches = await split_list(selected, chunk_size=batch_size)
+
+                slot_seconds = self.cache.series_slot_seconds if self.cache.usage_series is not None else 0
+
+                loop = asyncio.get_running_loop()
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    results = await asyncio.gather(
+                        *[loop.run_in_executor(pool, _replay_chunks, batch, slot_seconds) for batch in batches]
+                    )
+
+                for aggregate, batch_failed in results:
+                    failed.extend(batch_failed)
+                    for (bucket, user_id, cluster, slot), counters in aggregate.items():
+                        self.cache.add_usage_item(
+                            bucket=bucket,
+                            user_id=user_id,
+                            counters=counters,
+                            cluster=cluster if self.tag_clusters and cluster else None,
+                            timestamp=datetime.utcfromtimestamp(slot * slot_seconds) if slot is not None else None,
+                        )
+
+            for path in failed:
+                logger.error(f"[{self.__module__}] | Failed to read chunk {path}")
+
+            return self.cache.build_usage_summary(
+                received_items=len(chunks),
+                processed_requests=len(selected) - len(failed),
+                error=bool(selected) and len(failed) == len(selected),
+                include_rows=not self.summary_only,
+            )
+
+        except Exception as e:
+            summary = self.cache.build_usage_summary(
+                received_items=0,
+                processed_requests=0,
+                error=True,
+                include_rows=not self.summary_only,
+            )
+            logger.error(f"[{self.__module__}] | Replay Flow | Something went wrong | {e} ")
+
+            return summary
@@ -1,106 +1,134 @@
 import asyncio
-import re
+from asyncio import Semaphore
 from datetime import datetime, timedelta
 from typing import Optional
 
-from loguru import logger
-
+from s3_usage_collector.utils.log import logger
 from s3_usage_collector.api.s3client import S3Client
-from s3_usage_collector.data.config import semaphore, CustomConfig
+from s3_usage_collector.data.config import CustomConfig, ClusterConfig
+from s3_usage_collector.utils.params import to_bool
+from s3_usage_collector.utils.profiler import NullProfiler, PhaseProfiler
 from s3_usage_collector.utils.upload_cache import UploadCache
+from s3_usage_collector.utils.usage_items import iter_usage_items, parse_timestamp_from_object_name
+
+
+DEFAULT_CLUSTER = 'default'
 
 
 class UsageCollector:
     __module__ = 'S3 Usage Collector'
 
     def __init__(self,
-                 access_key: str,
-                 secret_key: str,
-                 host: str,
-                 settings: CustomConfig,
+                 access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None,
+                 host: Optional[str] = None,
+                 settings: Optional[CustomConfig] = None,
                  s3_usage_period_seconds: int = 3600,
                  s3_cache_timeout_seconds: int = 600,
                  save_chunks: bool = False,
                  remove_items: bool = False,
+                 clusters: Optional[list[ClusterConfig]] = None,
+                 tag_clusters: bool = False,
+                 cluster_timeout_seconds: Optional[int] = None,
+                 concurrency: int = 12,
+                 summary_only: bool = False,
+                 profile: bool = False,
+                 usage_slots: int = 0,
                  ):
 
-        self.s3_client = S3Client(access_key=access_key, secret_key=secret_key, endpoint=host)
+        if not clusters:
+            clusters = [
+                ClusterConfig(
+                    name=DEFAULT_CLUSTER,
+                    access_key=access_key,
+                    secret_key=secret_key,
+                    host=host,
+                    concurrency=concurrency,
+                )
+            ]
+            self.multi_cluster = False
+        else:
+            self.multi_cluster = True
+
+        self.clusters = clusters
+        self.s3_clients: dict[str, S3Client] = {
+            cluster.name: S3Client(
+                access_key=cluster.access_key,
+                secret_key=cluster.secret_key,
+                endpoint=cluster.host,
+                max_clients=cluster.concurrency,
+            )
+            for cluster in clusters
+        }
+        self.semaphores: dict[str, Semaphore] = {
+            cluster.name: Semaphore(cluster.concurrency) for cluster in clusters
+        }
+        self.s3_client = self.s3_clients[clusters[0].name]
+
         self.s3_usage_period_seconds = s3_usage_period_seconds
         self.s3_cache_timeout_seconds = s3_cache_timeout_seconds
-        self.remove_items=remove_items
-        self.save_chunks = save_chunks
-        self.cache = UploadCache(settings=settings)
-
-    async def get_stats(self, obj) -> list:
-        async with semaphore:
-            logger.debug(f'[{self.__module__}] | Started Collect {obj}')
-
-            usage = await self.s3_client.get_ostor_usage(obj=obj)
-            logger.debug(f'[{self.__module__}] | Usage - got {obj}')
-
-            self.cache.add_raw_stats_for_object(obj, usage)
-
-            if self.save_chunks:
-                self.cache.save_object_stats(obj)
-
-            data = usage.get("items") or []
+        self.remove_items = to_bool(remove_items)
+        self.save_chunks = to_bool(save_chunks)
+        self.tag_clusters = to_bool(tag_clusters)
+        self.cluster_timeout_seconds = cluster_timeout_seconds
+        self.summary_only = to_bool(summary_only)
+        self.run_status: dict = {"state": "idle"}
+        self.cache = UploadCache(settings=settings if settings else CustomConfig())
+        if usage_slots:
+            self.cache.enable_usage_series(period_seconds=s3_usage_period_seconds, slots=usage_slots)
+        self.profiler = PhaseProfiler(self.cache.settings.result_dir) if to_bool(profile) else NullProfiler()
 
-            for item in data:
-                key_data = item.get("key", {})
-                bucket = key_data.get("bucket")
-                user_id = key_data.get("user_id")
+    def _cluster_name(self, cluster: Optional[str]) -> str:
+        return cluster if cluster else self.clusters[0].name
 
-                if not bucket or not user_id:
-                    continue
+    async def get_stats(self, obj, cluster: Optional[str] = None) -> list:
+        cluster = self._cluster_name(cluster)
 
-                counters = item.get("counters", {})
-                if not counters:
-                    continue
+        async with self.semaphores[cluster]:
+            logger.debug(f'[{self.__module__}] | [{cluster}] | Started Collect {obj}')
 
-                self.cache.add_usage_item(
-                    bucket=bucket,
-                    user_id=user_id,
-                    counters=counters,
-                )
-
-                logger.debug(
-                    f"Aggregated stats: object={obj}, bucket={bucket}, "
-                    f"user_id={user_id}, storage_types={list(counters.keys())}"
-                )
+            usage = await self.s3_clients[cluster].get_ostor_usage(obj=obj)
+            logger.debug(f'[{self.__module__}] | [{cluster}] | Usage - got {obj}')
 
-            # После успешной обработки удаляем usage-объект из S3
+            # Chunks of different clusters may share object names
+            stats_cluster = cluster if self.multi_cluster else None
+            self.cache.add_raw_stats_for_object(obj, usage, cluster=stats_cluster)
 
-            #await self.s3_client.delete_ostor_usage_obj(obj=obj)
+            if self.save_chunks:
+                self.cache.save_object_stats(obj, cluster=stats_cluster)
+
+            return usage.get("items") or []
+
+    def aggregate_stats(self, obj: str, data: list, cluster: Optional[str] = None):
+        tag = cluster if self.tag_clusters else None
+        # In time-bucketed mode the object timestamp selects the slot
+        timestamp = parse_timestamp_from_object_name(obj) if self.cache.usage_series is not None else None
+
+        for bucket, user_id, counters in iter_usage_items(data):
+            self.cache.add_usage_item(
+                bucket=bucket,
+                user_id=user_id,
+                counters=counters,
+                cluster=tag,
+                timestamp=timestamp,
+            )
 
-            return data
+            logger.debug(
+                f"Aggregated stats: object={obj}, bucket={bucket}, "
+                f"user_id={user_id}, storage_types={list(counters.keys())}"
+            )
 
-    async def delete_s3_stat_object(self, obj):
+    async def delete_s3_stat_object(self, obj, cluster: Optional[str] = None):
+        cluster = self._cluster_name(cluster)
         try:
-            await self.s3_client.delete_ostor_usage_obj(obj=obj)
+            await self.s3_clients[cluster].delete_ostor_usage_obj(obj=obj)
             logger.info(f"{self.__module__} | Success deleted s3 stat object: {obj}")
 
         except Exception as e:
             logger.error(f"{self.__module__} | Error in  deleting s3 stat object: {obj} | {e}")
 
     def _parse_timestamp_from_object_name(self, obj_name: str) -> Optional[datetime]:
-        pattern = r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{3})?Z)'
-        match = re.search(pattern, obj_name)
-        
-        if not match:
-            logger.warning(f"Could not parse timestamp from object name: {obj_name}")
-            return None
-        
-        timestamp_str = match.group(1)
-        try:
-            if '.' in timestamp_str:
-                dt = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S.%fZ')
-            else:
-                dt = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%SZ')
-
-            return dt
-        except ValueError as e:
-            logger.warning(f"Failed to parse timestamp '{timestamp_str}' from object '{obj_name}': {e}")
-            return None
+        return parse_timestamp_from_object_name(obj_name)
 
     def _filter_ready_objects(self, items: list[str]) -> list[str]:
         if not items:
@@ -160,48 +188,145 @@ class UsageCollector:
         )
         return ready_items
 
-    async def ostor_usage(self):
-        try:
+    async def _collect_object(self, obj: str, cluster: str, collected: list[str]):
+        data = await self.get_stats(obj, cluster=cluster)
+        # Merged as soon as it arrives, so the query API sees the run in progress
+        self.aggregate_stats(obj, data, cluster=cluster)
+        collected.append(obj)
 
-            all_stats = await self.s3_client.get_ostor_usage()
+    async def _collect_cluster_objects(self, cluster: ClusterConfig, report: dict, collected: list[str]):
+        with self.profiler.phase('listing'):
+            all_stats = await self.s3_clients[cluster.name].get_ostor_usage()
             items = all_stats.get('items', [])
-            logger.debug(f"[{self.__module__}] | S3_Stats | Got {len(items)} objects from statistics")
+        logger.debug(f"[{self.__module__}] | [{cluster.name}] | S3_Stats | Got {len(items)} objects from statistics")
 
+        with self.profiler.phase('filter'):
             filtered_items = self._filter_ready_objects(items)
 
-            received_items = len(items)
-            processed_requests = len(filtered_items)
+        report["received_items"] = len(items)
 
-            if not filtered_items:
-                logger.warning(f"[{self.__module__}] | No objects to process (all in guard zone)")
+        if not filtered_items:
+            logger.warning(f"[{self.__module__}] | [{cluster.name}] | No objects to process (all in guard zone)")
+            return
 
-                return self.cache.build_usage_summary(
-                    received_items=received_items,
-                    processed_requests=processed_requests,
-                )
+        with self.profiler.phase('fetch_aggregate'):
+            tasks = [self._collect_object(obj, cluster.name, collected) for obj in filtered_items]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for obj, result in zip(filtered_items, results):
+            if isinstance(result, BaseException):
+                report["failed_objects"] += 1
+                logger.error(f"[{self.__module__}] | [{cluster.name}] | Failed to collect {obj} | {result}")
+
+    async def _collect_cluster(self, cluster: ClusterConfig) -> tuple[dict, list[str]]:
+        """
+        Collects one cluster in isolation from the others. Every object is merged into
+        the shared aggregate as soon as it is received. Objects that failed individually
+        are dropped and counted in failed_objects, the cluster stays done.
+        If listing fails or the cluster times out, the cluster gets status error;
+        objects received before the timeout stay merged.
+        Returns the report and the merged objects.
+        """
+        report = {
+            "cluster": cluster.name,
+            "host": cluster.host,
+            "status": "skip",
+            "received_items": 0,
+            "processed_requests": 0,
+            "failed_objects": 0,
+        }
+        collected: list[str] = []
 
+        try:
+            collect = self._collect_cluster_objects(cluster, report, collected)
+            if self.cluster_timeout_seconds:
+                await asyncio.wait_for(collect, timeout=self.cluster_timeout_seconds)
+            else:
+                await collect
+
+        except Exception as e:
+            report["status"] = "error"
+            report["error"] = str(e) or type(e).__name__
+            logger.error(f"[{self.__module__}] | [{cluster.name}] | Cluster collect failed | {report['error']}")
+
+        report["processed_requests"] = len(collected)
+
+        if report["status"] == "error":
+            return report, collected
+
+        if report["processed_requests"]:
+            report["status"] = "done"
+        elif report["failed_objects"]:
+            report["status"] = "error"
+            report["error"] = f"Failed to collect all {report['failed_objects']} objects"
+
+        return report, collected
+
+    async def close(self):
+        for s3_client in self.s3_clients.values():
+            await s3_client.close()
+
+    def _finish_run_status(self, summary: dict):
+        self.run_status = {
+            **self.run_status,
+            "state": summary.get("status"),
+            "finished_at": datetime.utcnow().isoformat(),
+            "received_items": summary.get("received_items"),
+            "processed_requests": summary.get("processed_requests"),
+            "summarized_rows": len(self.cache.usage_aggregate),
+        }
+        if "clusters" in summary:
+            self.run_status["clusters"] = summary["clusters"]
+
+    async def ostor_usage(self):
+        self.run_status = {"state": "collecting", "started_at": datetime.utcnow().isoformat()}
+        await self.profiler.start()
+        try:
             self.cache.reset_usage_aggregate()
-            tasks = [self.get_stats(obj) for obj in filtered_items]
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            results = await asyncio.gather(*[self._collect_cluster(cluster) for cluster in self.clusters])
+            reports = [report for report, _ in results]
 
-            summary = self.cache.build_usage_summary(
-                received_items=received_items,
-                processed_requests=processed_requests,
-            )
+            received_items = sum(report["received_items"] for report in reports)
+            processed_requests = sum(report["processed_requests"] for report in reports)
+            error = all(report["status"] == "error" for report in reports)
 
-            if self.remove_items:
-                tasks = [self.delete_s3_stat_object(obj) for obj in filtered_items]
-                await asyncio.gather(*tasks, return_exceptions=True)
+            with self.profiler.phase('summary'):
+                summary = self.cache.build_usage_summary(
+                    received_items=received_items,
+                    processed_requests=processed_requests,
+                    error=error,
+                    clusters=reports if self.multi_cluster else None,
+                    include_rows=not self.summary_only,
+                )
 
+            if self.remove_items:
+                with self.profiler.phase('delete'):
+                    tasks = [
+                        self.delete_s3_stat_object(obj, cluster=report["cluster"])
+                        for report, processed in results
+                        for obj in processed
+                    ]
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+            self._finish_run_status(summary)
             return summary
 
         except Exception as e:
             summary = self.cache.build_usage_summary(
                 received_items=0,
                 processed_requests=0,
-                error=True
+                error=True,
+                include_rows=not self.summary_only,
             )
             logger.error(f"[{self.__module__}] | S3 Collector Flow | Something went wrong | {e} ")
 
-            return summary
\ No newline at end of file
+            self._finish_run_status(summary)
+            return summary
+
+        finally:
+            await self.close()
+
+            profile_dir = await self.profiler.stop()
+            if profile_dir:
+                self.run_status["profile"] = profile_dir
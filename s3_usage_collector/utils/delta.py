@@ -0,0 +1,149 @@
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from s3_usage_collector.utils.log import logger
+from s3_usage_collector.utils.sinks import numeric_counters
+
+
+def usage_key_hash(bucket: str, user_id: str) -> str:
+    return hashlib.blake2b(f"{bucket}\0{user_id}".encode(), digest_size=8).hexdigest()
+
+
+def build_usage_index(aggregate: Dict[Tuple[str, str], dict], created: str) -> dict:
+    """
+    Compact index of an aggregate:
+    {"created": ..., "columns": [...], "rows": {hash: [bucket, user_id, [values in columns order]]}}
+    """
+    flat = {key: numeric_counters(counters) for key, counters in aggregate.items()}
+    columns = sorted({name for values in flat.values() for name in values})
+    positions = {name: i for i, name in enumerate(columns)}
+
+    rows = {}
+    for (bucket, user_id), values in flat.items():
+        vector = [None] * len(columns)
+        for name, value in values.items():
+            vector[positions[name]] = value
+        rows[usage_key_hash(bucket, user_id)] = [bucket, user_id, vector]
+
+    return {"created": created, "columns": columns, "rows": rows}
+
+
+def load_usage_index(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to read usage index '{path}': {e}")
+        return None
+
+
+def stage_usage_index(index: dict, path: str) -> str:
+    """
+    Writes the index next to path as {path}.tmp, commit_usage_index() puts it in place.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    return tmp_path
+
+
+def commit_usage_index(tmp_path: str, path: str) -> str:
+    os.replace(tmp_path, path)
+    return path
+
+
+def discard_file(path: Optional[str]):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Failed to remove '{path}': {e}")
+
+
+def is_complete_summary(summary: dict) -> bool:
+    """
+    Summary of a run that can be used as the previous aggregate for a delta:
+    status done and no failed cluster.
+    """
+    if summary.get("status") != "done":
+        return False
+    return not any(cluster.get("status") == "error" for cluster in summary.get("clusters") or [])
+
+
+def index_from_backups(backup_dir: str) -> Optional[dict]:
+    """
+    First run with delta enabled: the previous aggregate is taken from the latest complete summary backup.
+    Backups of skipped or failed runs hold no or partial rows and are passed over.
+    """
+    backups = sorted(glob.glob(os.path.join(backup_dir, "usage_summary_*.json")), reverse=True)
+
+    for path in backups:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read usage backup '{path}': {e}")
+            continue
+
+        rows = summary.get("summarized_data")
+        if not is_complete_summary(summary) or not rows:
+            logger.debug(f"Skip usage backup '{path}' (status={summary.get('status')}, rows={len(rows or [])})")
+            continue
+
+        aggregate = {(row["bucket"], row["user_id"]): row["counters"]["counters"] for row in rows}
+        logger.info(f"Usage index bootstrapped from backup '{path}'")
+        return build_usage_index(aggregate, created=os.path.basename(path))
+
+    return None
+
+
+def iter_usage_delta(index: Optional[dict], aggregate: Dict[Tuple[str, str], dict]) -> Iterator[dict]:
+    """
+    Rows of aggregate that are new or changed against index, then rows that disappeared.
+    'delta' holds flattened numeric differences (current - previous), zero differences are omitted.
+    """
+    columns = index["columns"] if index else []
+    previous_rows = index["rows"] if index else {}
+    seen = set()
+
+    for (bucket, user_id), counters in aggregate.items():
+        key_hash = usage_key_hash(bucket, user_id)
+        current = numeric_counters(counters)
+
+        previous = previous_rows.get(key_hash)
+        if previous is None:
+            yield {"bucket": bucket, "user_id": user_id, "change": "new", "delta": current}
+            continue
+
+        seen.add(key_hash)
+        old = {name: value for name, value in zip(columns, previous[2]) if value is not None}
+        delta = _diff(current, old)
+        if delta:
+            yield {"bucket": bucket, "user_id": user_id, "change": "changed", "delta": delta}
+
+    for key_hash, (bucket, user_id, vector) in previous_rows.items():
+        if key_hash in seen:
+            continue
+        old = {name: value for name, value in zip(columns, vector) if value is not None}
+        yield {"bucket": bucket, "user_id": user_id, "change": "removed", "delta": _diff({}, old)}
+
+
+def _diff(current: Dict[str, float], old: Dict[str, float]) -> Dict[str, float]:
+    delta = {}
+    for name in current.keys() | old.keys():
+        value = current.get(name, 0) - old.get(name, 0)
+        if value:
+            delta[name] = value
+    return dict(sorted(delta.items()))
+
+
+def count_rows(rows: Iterable[dict], counter: dict) -> Iterator[dict]:
+    for row in rows:
+        counter[row["change"]] = counter.get(row["change"], 0) + 1
+        yield row
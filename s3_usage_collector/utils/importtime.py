@@ -0,0 +1,83 @@
+"""
+Cold start budget check for the collector imports.
+
+    python -m s3_usage_collector.utils.importtime BUDGET_MS=150 RUNS=5
+
+Runs `python -X importtime` in a fresh interpreter, takes the best of RUNS
+cumulative import times of the modules main.py imports and exits with 1 when
+it is over BUDGET_MS or when a lazily imported dependency got imported eagerly.
+"""
+import os
+import subprocess
+import sys
+from typing import Optional
+
+# Modules imported by main.py at start
+STARTUP_MODULES = (
+    's3_usage_collector.data.config',
+    's3_usage_collector.tasks.usage',
+    's3_usage_collector.utils.params',
+)
+
+# Must be imported on first use only
+LAZY_MODULES = ('curl_cffi', 'loguru', 'dotenv', 'pyarrow', 'pstats')
+
+DEFAULT_BUDGET_MS = 150
+DEFAULT_RUNS = 5
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure_import_ms(modules: tuple = STARTUP_MODULES) -> tuple[float, list[str]]:
+    """
+    Cumulative import time of modules in a fresh interpreter (ms) and the lazy modules it imported.
+    """
+    code = (
+        f"import sys; import {', '.join(modules)}; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() in modules and name == f" {name.strip()}":
+            total_us += int(cumulative)
+
+    eager = [name for name in result.stdout.strip().split(',') if name]
+    return total_us / 1000, eager
+
+
+def check(budget_ms: float = DEFAULT_BUDGET_MS, runs: int = DEFAULT_RUNS) -> tuple[bool, float, list[str]]:
+    measurements = [measure_import_ms() for _ in range(max(1, runs))]
+    best_ms = min(ms for ms, _ in measurements)
+    eager = sorted({name for _, names in measurements for name in names})
+    return best_ms <= budget_ms and not eager, best_ms, eager
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    params = dict(arg.split('=', 1) for arg in (argv if argv is not None else sys.argv[1:]) if '=' in arg)
+    budget_ms = float(params.get('BUDGET_MS', DEFAULT_BUDGET_MS))
+    runs = int(params.get('RUNS', DEFAULT_RUNS))
+
+    ok, best_ms, eager = check(budget_ms=budget_ms, runs=runs)
+
+    print(f"import time: {best_ms:.1f} ms (budget {budget_ms:.0f} ms, best of {runs})")
+    if eager:
+        print(f"imported eagerly: {', '.join(eager)}")
+    print("OK" if ok else "FAILED")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
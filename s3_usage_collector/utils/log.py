@@ -0,0 +1,14 @@
+class _LazyLogger:
+    """
+    Proxy for loguru.logger: loguru is imported on the first log call, not at import time.
+    """
+
+    def __getattr__(self, name):
+        from loguru import logger
+
+        attr = getattr(logger, name)
+        setattr(self, name, attr)
+        return attr
+
+
+logger = _LazyLogger()
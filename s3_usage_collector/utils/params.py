@@ -0,0 +1,9 @@
+def to_bool(value) -> bool:
+    """
+    Converts CLI values 'TRUE' / 'FALSE' (any case) to bool.
+    """
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().upper() in ('TRUE', '1', 'YES', 'Y')
@@ -0,0 +1,240 @@
+import asyncio
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Optional
+
+from s3_usage_collector.utils.log import logger
+
+
+class NullProfiler:
+    """
+    Used when PROFILE is off: phases cost nothing.
+    """
+
+    async def start(self):
+        return None
+
+    async def stop(self) -> Optional[str]:
+        return None
+
+    def phase(self, name: str):
+        return nullcontext()
+
+
+class PhaseProfiler:
+    """
+    Per-phase cProfile stats, tracemalloc top allocators and event-loop lag.
+
+    cProfile has one hook per thread, so when phases overlap (several clusters,
+    concurrent get_stats) CPU time goes to the most recently entered phase.
+    Wall time and memory are recorded for every active phase. A loop lag sample
+    is charged to every phase that was active or entered since the previous
+    sample, so synchronous phases that never yield still get the lag they caused.
+
+    The tracemalloc peak is process-global, so it is read and reset at every phase
+    enter and exit and charged to all phases active in between. For overlapping
+    phases peak_bytes is the peak of the process while the phase was active.
+    Allocations made by the profiler itself are left out of top_allocations.
+
+    Dump: {output_dir}/profile_YYYY-MM-DD_HH-MM-SS/
+        profile.json      timings, loop lag, memory per phase
+        {phase}.prof      cProfile stats, for pstats / snakeviz
+        {phase}.txt       top functions by cumulative time
+    """
+    __module__ = 'S3 Usage Profiler'
+
+    def __init__(self, output_dir: str, top: int = 30, lag_interval: float = 0.05, frames: int = 5):
+        self.output_dir = output_dir
+        self.top = top
+        self.lag_interval = lag_interval
+        self.frames = frames
+
+        self.phases: dict[str, dict] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._active: list[str] = []
+        # Phases entered since the last loop lag sample
+        self._entered: set[str] = set()
+        self._enabled: Optional[cProfile.Profile] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._started: Optional[datetime] = None
+        # Time spent in tracemalloc snapshots, excluded from loop lag
+        self._overhead = 0.0
+
+    async def start(self):
+        self._started = datetime.now()
+        tracemalloc.start(self.frames)
+        self._lag_task = asyncio.create_task(self._sample_lag())
+
+    async def stop(self) -> Optional[str]:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+        if self._enabled is not None:
+            self._enabled.disable()
+            self._enabled = None
+
+        try:
+            return self._dump()
+        except Exception as e:
+            logger.error(f"[{self.__module__}] | Failed to save profile | {e}")
+            return None
+        finally:
+            tracemalloc.stop()
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            overhead = self._overhead
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - started - self.lag_interval - (self._overhead - overhead))
+
+            charged = set(self._active) | self._entered
+            self._entered = set()
+
+            for name in charged:
+                stats = self.phases[name]["loop_lag"]
+                stats["samples"] += 1
+                stats["total"] += lag
+                stats["max"] = max(stats["max"], lag)
+
+    def _phase_stats(self, name: str) -> dict:
+        if name not in self.phases:
+            self.phases[name] = {
+                "calls": 0,
+                "wall_seconds": 0.0,
+                "loop_lag": {"samples": 0, "total": 0.0, "max": 0.0},
+                "memory": {"peak_bytes": 0, "allocations": {}},
+            }
+            self._profiles[name] = cProfile.Profile()
+        return self.phases[name]
+
+    def _switch_profile(self):
+        if self._enabled is not None:
+            self._enabled.disable()
+
+        self._enabled = self._profiles[self._active[-1]] if self._active else None
+
+        if self._enabled is not None:
+            self._enabled.enable()
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+
+    def _charge_peak(self):
+        """
+        Peak since the previous enter/exit goes to every phase active in that interval.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        for name in set(self._active):
+            memory = self.phases[name]["memory"]
+            memory["peak_bytes"] = max(memory["peak_bytes"], peak)
+
+    @contextmanager
+    def phase(self, name: str):
+        stats = self._phase_stats(name)
+        overhead_started = time.perf_counter()
+        snapshot = self._take_snapshot()
+        self._charge_peak()
+        self._overhead += time.perf_counter() - overhead_started
+
+        self._active.append(name)
+        self._entered.add(name)
+        self._switch_profile()
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            stats["calls"] += 1
+            stats["wall_seconds"] += finished - started
+
+            # Charged while this phase is still active
+            self._charge_peak()
+
+            # Remove this occurrence, other tasks may have entered phases after it
+            del self._active[len(self._active) - 1 - self._active[::-1].index(name)]
+            self._switch_profile()
+
+            memory = stats["memory"]
+            for diff in self._take_snapshot().compare_to(snapshot, "lineno")[:self.top]:
+                where = str(diff.traceback)
+                allocation = memory["allocations"].setdefault(where, {"size_diff_bytes": 0, "count_diff": 0})
+                allocation["size_diff_bytes"] += diff.size_diff
+                allocation["count_diff"] += diff.count_diff
+
+            self._overhead += time.perf_counter() - finished
+
+    def _dump(self) -> str:
+        # pstats is only needed for the dump, keep it out of the import path
+        import pstats
+
+        ts = self._started.strftime("%Y-%m-%d_%H-%M-%S")
+        profile_dir = os.path.join(self.output_dir, f"profile_{ts}")
+        os.makedirs(profile_dir, exist_ok=True)
+
+        report = {"started_at": self._started.isoformat(), "phases": {}}
+
+        for name, stats in self.phases.items():
+            lag = stats["loop_lag"]
+            memory = stats["memory"]
+            top_allocations = sorted(
+                memory["allocations"].items(),
+                key=lambda item: item[1]["size_diff_bytes"],
+                reverse=True,
+            )[:self.top]
+
+            phase_report = {
+                "calls": stats["calls"],
+                "wall_seconds": round(stats["wall_seconds"], 6),
+                "loop_lag_ms": {
+                    "samples": lag["samples"],
+                    "mean": round(lag["total"] / lag["samples"] * 1000, 3) if lag["samples"] else 0.0,
+                    "max": round(lag["max"] * 1000, 3),
+                },
+                "memory": {
+                    "peak_bytes": memory["peak_bytes"],
+                    "top_allocations": [{"where": where, **allocation} for where, allocation in top_allocations],
+                },
+                "cprofile": None,
+            }
+
+            profile = self._profiles[name]
+            try:
+                profile_stats = pstats.Stats(profile)
+            except TypeError:
+                # Phase never got the profiler hook (no calls recorded)
+                profile_stats = None
+
+            if profile_stats is not None:
+                prof_path = os.path.join(profile_dir, f"{name}.prof")
+                profile_stats.dump_stats(prof_path)
+                with open(os.path.join(profile_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                    pstats.Stats(prof_path, stream=f).sort_stats("cumulative").print_stats(self.top)
+                phase_report["cprofile"] = os.path.basename(prof_path)
+
+            report["phases"][name] = phase_report
+
+        report_path = os.path.join(profile_dir, "profile.json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        logger.info(f"[{self.__module__}] | Saved profile to '{profile_dir}'")
+        return profile_dir
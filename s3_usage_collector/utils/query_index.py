@@ -0,0 +1,72 @@
+from typing import Dict, Optional, Set, Tuple
+
+from s3_usage_collector.utils.sinks import flatten_counters
+
+
+def counter_value(counters: dict, counter: str):
+    """
+    'ops.get' -> counters["ops"]["get"], None if there is no such counter.
+    """
+    value = counters
+    for part in counter.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+class QueryIndex:
+    """
+    Secondary indexes over UploadCache.usage_aggregate for the query API.
+
+    user -> buckets and bucket -> users are updated on every add_usage_item.
+    Keeping a sorted order per counter on every update would cost O(rows) per item,
+    so add() only marks the counters it touched and the order is rebuilt once,
+    on the first top() after a change.
+    """
+
+    def __init__(self):
+        self.user_buckets: Dict[str, Set[str]] = {}
+        self.bucket_users: Dict[str, Set[str]] = {}
+        self.counters: Set[str] = set()
+        self._sorted: Dict[str, list[Tuple[str, str]]] = {}
+        self._dirty: Set[str] = set()
+
+    def add(self, bucket: str, user_id: str, counters: dict):
+        self.user_buckets.setdefault(user_id, set()).add(bucket)
+        self.bucket_users.setdefault(bucket, set()).add(user_id)
+
+        names = flatten_counters(counters).keys()
+        self.counters.update(names)
+        self._dirty.update(names)
+
+    def top(self, aggregate: Dict[Tuple[str, str], dict], counter: str, n: int) -> list[Tuple[str, str]]:
+        if counter in self._dirty or counter not in self._sorted:
+            self._sorted[counter] = self._sort_by_counter(aggregate, counter)
+            self._dirty.discard(counter)
+
+        return self._sorted[counter][:n]
+
+    @staticmethod
+    def _sort_by_counter(aggregate: Dict[Tuple[str, str], dict], counter: str) -> list[Tuple[str, str]]:
+        values = []
+        for key, counters in aggregate.items():
+            value = counter_value(counters, counter)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append((value, key))
+
+        values.sort(key=lambda item: item[0], reverse=True)
+        return [key for _, key in values]
+
+    def buckets_of(self, user_id: str) -> Optional[Set[str]]:
+        return self.user_buckets.get(user_id)
+
+    def users_of(self, bucket: str) -> Optional[Set[str]]:
+        return self.bucket_users.get(bucket)
+
+    def reset(self):
+        self.user_buckets = {}
+        self.bucket_users = {}
+        self.counters = set()
+        self._sorted = {}
+        self._dirty = set()
@@ -0,0 +1,165 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
+
+from s3_usage_collector.utils.log import logger
+
+
+def flatten_counters(counters: dict, prefix: str = '') -> dict:
+    """
+    {"ops": {"get": 1}} -> {"ops.get": 1}
+    """
+    flat = {}
+    for key, value in counters.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_counters(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def numeric_counters(counters: dict) -> dict:
+    """
+    Flattened counters without non-numeric values.
+    """
+    return {
+        name: value
+        for name, value in flatten_counters(counters).items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+class UsageSink(ABC):
+    """
+    Writes usage summary rows to a file one by one, straight from the aggregate.
+    """
+    extension = ''
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abstractmethod
+    def write(self, header: dict, rows: Iterable[dict], columns: dict) -> Optional[str]:
+        """
+        Returns the written path, None if the format was skipped.
+        """
+
+
+class JsonSink(UsageSink):
+    """
+    Same layout as json.dump(summary, indent=2), without building the whole document in memory.
+    """
+    extension = 'json'
+
+    def __init__(self, path: str, rows_key: str = "summarized_data"):
+        super().__init__(path)
+        self.rows_key = rows_key
+
+    def write(self, header: dict, rows: Iterable[dict], columns: dict) -> Optional[str]:
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{\n")
+            for key, value in header.items():
+                f.write(f"  {json.dumps(key)}: ")
+                f.write(json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                f.write(",\n")
+
+            f.write(f"  {json.dumps(self.rows_key)}: [")
+            first = True
+            for row in rows:
+                f.write("\n    " if first else ",\n    ")
+                f.write(json.dumps(row, indent=2, ensure_ascii=False).replace("\n", "\n    "))
+                first = False
+            f.write("]\n}" if first else "\n  ]\n}")
+
+        return self.path
+
+
+class NdjsonSink(UsageSink):
+    extension = 'ndjson'
+
+    def write(self, header: dict, rows: Iterable[dict], columns: dict) -> Optional[str]:
+        with open(self.path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False))
+                f.write("\n")
+
+        return self.path
+
+
+class CsvSink(UsageSink):
+    """
+    One column per flattened counter, e.g. bucket,user_id,ops.get,ops.put
+    """
+    extension = 'csv'
+
+    def write(self, header: dict, rows: Iterable[dict], columns: dict) -> Optional[str]:
+        fieldnames = ["bucket", "user_id", *columns]
+
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({
+                    "bucket": row["bucket"],
+                    "user_id": row["user_id"],
+                    **flatten_counters(row["counters"]["counters"]),
+                })
+
+        return self.path
+
+
+class ParquetSink(UsageSink):
+    """
+    Requires pyarrow. Rows are written in record batches of batch_size.
+    """
+    extension = 'parquet'
+    batch_size = 50000
+
+    def write(self, header: dict, rows: Iterable[dict], columns: dict) -> Optional[str]:
+        # pyarrow is optional and slow to import, so it is imported only when parquet is requested
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning(f"pyarrow is not installed, skip writing '{self.path}'")
+            return None
+
+        types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+        schema = pa.schema(
+            [("bucket", pa.string()), ("user_id", pa.string())]
+            + [(name, types[kind]) for name, kind in columns.items()]
+        )
+
+        with pq.ParquetWriter(self.path, schema) as writer:
+            batch = []
+            for row in rows:
+                values = flatten_counters(row["counters"]["counters"])
+                record = {"bucket": row["bucket"], "user_id": row["user_id"]}
+                for name, kind in columns.items():
+                    value = values.get(name)
+                    # A column is typed by all rows, e.g. str when any row has a non-numeric value
+                    record[name] = kind(value) if value is not None else None
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch = []
+
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+        return self.path
+
+
+SINKS = {
+    sink.extension: sink
+    for sink in (JsonSink, NdjsonSink, CsvSink, ParquetSink)
+}
+
+
+def get_sink(output_format: str, path: str) -> UsageSink:
+    output_format = output_format.strip().lower()
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of: {', '.join(SINKS)}")
+    return SINKS[output_format](path)
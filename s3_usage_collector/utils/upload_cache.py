@@ -1,10 +1,24 @@
 import json
 import os
+import shutil
 from datetime import datetime
-from typing import Dict, Optional, Tuple
-from loguru import logger
-
+from typing import Dict, Iterator, Optional, Tuple
+from s3_usage_collector.utils.log import logger
 from s3_usage_collector.data.config import CustomConfig
+from s3_usage_collector.utils.delta import (
+    build_usage_index,
+    commit_usage_index,
+    count_rows,
+    discard_file,
+    index_from_backups,
+    is_complete_summary,
+    iter_usage_delta,
+    load_usage_index,
+    stage_usage_index,
+)
+from s3_usage_collector.utils.query_index import QueryIndex
+from s3_usage_collector.utils.sinks import JsonSink, flatten_counters, get_sink, numeric_counters
+from s3_usage_collector.utils.usage_series import UsageSeries
 
 class UploadCache:
     def __init__(self, settings: CustomConfig):
@@ -13,15 +27,25 @@ class UploadCache:
         self.current_stats: Dict[str, Dict] = {}
         self.current_buckets: Dict[str, dict] = {}
         self.usage_aggregate: Dict[Tuple[str, str], Dict] = {}
+        self.usage_clusters: Dict[Tuple[str, str], Dict[str, Dict]] = {}
+        self.query_index: Optional[QueryIndex] = None
+        # Time-bucketed mode: (bucket, user_id) -> UsageSeries, see enable_usage_series
+        self.usage_series: Optional[Dict[Tuple[str, str], UsageSeries]] = None
+        self.series_slot_seconds = 0
+        self.series_slots = 0
 
-        self._ensure_directories()
+        self._created_dirs: set = set()
 
-    def _ensure_directories(self):
-        os.makedirs(self.settings.result_dir, exist_ok=True)
-        os.makedirs(self.settings.chunks_dir, exist_ok=True)
-        os.makedirs(self.settings.backup_dir, exist_ok=True)
+    def _ensure_dir(self, path: str):
+        # Directories are created right before the first write, not in __init__
+        if path and path not in self._created_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._created_dirs.add(path)
 
     def save_usage_summary_to_file(self, summary: dict) -> tuple[Optional[str], Optional[str]]:
+        """
+        Rows are streamed from usage_aggregate, 'summarized_data' of the summary is not used.
+        """
 
         if not summary:
             logger.warning("No usage summary to save")
@@ -34,23 +58,120 @@ class UploadCache:
 
         main_path = self.settings.usage_summary_file
 
+        header = {key: value for key, value in summary.items() if key != "summarized_data"}
+        with_rows = summary.get("status") != "skip"
+
         try:
-            with open(main_path, "w", encoding="utf-8") as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
+            self._ensure_dir(os.path.dirname(main_path))
+            self._ensure_dir(os.path.dirname(results_usage_log))
+            self._ensure_dir(self.settings.backup_dir)
 
-            with open(results_usage_log, "w", encoding="utf-8") as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
+            JsonSink(main_path).write(header, self._summary_rows(with_rows), {})
 
-            with open(backup_path, "w", encoding="utf-8") as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
+            # Copies are byte-identical, no need to serialize again
+            shutil.copyfile(main_path, results_usage_log)
+            shutil.copyfile(main_path, backup_path)
 
             logger.info(f"Saved usage summary to '{main_path}', backup='{backup_path}'")
-            return main_path, backup_path
 
         except Exception as e:
             logger.error(f"Failed to save usage summary (main='{main_path}', backup='{backup_path}'): {e}")
             return None, None
 
+        self.save_usage_outputs(header, with_rows)
+
+        return main_path, backup_path
+
+    def save_usage_outputs(self, header: dict, with_rows: bool = True) -> list[str]:
+        if not self.settings.output_formats:
+            return []
+
+        columns = self.counter_columns() if with_rows else {}
+        base_path = os.path.splitext(self.settings.usage_summary_file)[0]
+
+        saved = []
+        for output_format in self.settings.output_formats:
+            path = f"{base_path}.{output_format}"
+            if os.path.abspath(path) == os.path.abspath(self.settings.usage_summary_file):
+                # OUTPUT_FORMATS=json: that file is the main summary, already written
+                logger.warning(f"Skip output format '{output_format}': '{path}' is the usage summary file itself")
+                continue
+
+            try:
+                result = get_sink(output_format, path).write(header, self._summary_rows(with_rows), columns)
+            except Exception as e:
+                logger.error(f"Failed to save usage summary to '{path}': {e}")
+                continue
+
+            if result:
+                saved.append(result)
+                logger.info(f"Saved usage summary to '{result}'")
+
+        return saved
+
+    def save_usage_delta(self, header: dict) -> Optional[str]:
+        """
+        Writes rows that are new, changed or disappeared since the previous run
+        and replaces the stored index with the current aggregate.
+
+        The new index is written to a temporary file first and put in place right after
+        the delta. If either fails, the delta is removed and the previous index is kept,
+        so a published delta always matches the stored index.
+        """
+        ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+        index = load_usage_index(self.settings.usage_index_file)
+        if index is None:
+            index = index_from_backups(self.settings.backup_dir)
+
+        delta_path = self.settings.usage_delta_file
+        backup_path = os.path.join(self.settings.backup_dir, f"usage_delta_{ts}.json")
+
+        delta_header = {
+            **header,
+            "previous_run": index["created"] if index else None,
+            "current_run": ts,
+        }
+        changes: dict = {}
+        index_tmp_path = None
+        delta_started = False
+
+        try:
+            self._ensure_dir(os.path.dirname(delta_path))
+            self._ensure_dir(self.settings.backup_dir)
+            self._ensure_dir(os.path.dirname(self.settings.usage_index_file))
+
+            index_tmp_path = stage_usage_index(
+                build_usage_index(self.usage_aggregate, created=ts), self.settings.usage_index_file
+            )
+
+            delta_started = True
+            rows = count_rows(iter_usage_delta(index, self.usage_aggregate), changes)
+            JsonSink(delta_path, rows_key="summarized_delta").write(delta_header, rows, {})
+
+            commit_usage_index(index_tmp_path, self.settings.usage_index_file)
+            index_tmp_path = None
+
+        except Exception as e:
+            logger.error(f"Failed to save usage delta '{delta_path}', previous usage index is kept: {e}")
+            discard_file(index_tmp_path)
+            if delta_started:
+                discard_file(delta_path)
+            return None
+
+        try:
+            shutil.copyfile(delta_path, backup_path)
+        except Exception as e:
+            logger.error(f"Failed to save usage delta backup '{backup_path}': {e}")
+
+        logger.info(
+            f"Saved usage delta to '{delta_path}': new={changes.get('new', 0)}, "
+            f"changed={changes.get('changed', 0)}, removed={changes.get('removed', 0)}"
+        )
+        return delta_path
+
+    def _summary_rows(self, with_rows: bool) -> Iterator[dict]:
+        return self.iter_usage_rows() if with_rows else iter(())
 
     def add_upload(self, bucket: str, storage_type: str, size_mb: float):
         if bucket not in self.current_upload:
@@ -69,6 +190,7 @@ class UploadCache:
         upload_file = os.path.join(self.settings.chunks_dir, f"upload_{date_str}.json")
 
         try:
+            self._ensure_dir(self.settings.chunks_dir)
             with open(upload_file, "w", encoding="utf-8") as f:
                 json.dump(self.current_upload, f, indent=2, ensure_ascii=False)
             logger.info(f"Saved current upload to {upload_file}")
@@ -87,20 +209,26 @@ class UploadCache:
         self.current_upload = {}
         logger.debug("Current upload data reset")
 
-    def add_raw_stats_for_object(self, object_name: str, raw_usage: dict):
+    @staticmethod
+    def _stats_key(object_name: str, cluster: Optional[str] = None) -> str:
+        return f"{cluster}/{object_name}" if cluster else object_name
+
+    def add_raw_stats_for_object(self, object_name: str, raw_usage: dict, cluster: Optional[str] = None):
 
-        self.current_stats[object_name] = raw_usage
+        self.current_stats[self._stats_key(object_name, cluster)] = raw_usage
         logger.debug(f"Added raw stats for object '{object_name}'")
 
-    def save_object_stats(self, object_name: str) -> Optional[str]:
-        data = self.current_stats.get(object_name)
+    def save_object_stats(self, object_name: str, cluster: Optional[str] = None) -> Optional[str]:
+        stats_key = self._stats_key(object_name, cluster)
+        data = self.current_stats.get(stats_key)
         if not data:
             logger.warning(f"No stats data for object '{object_name}' to save")
             return None
 
-        stats_file = os.path.join(self.settings.chunks_dir, f"{object_name}.json")
+        stats_file = os.path.join(self.settings.chunks_dir, f"{stats_key}.json")
 
         try:
+            self._ensure_dir(os.path.dirname(stats_file))
             with open(stats_file, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
             logger.info(f"Saved stats for object '{object_name}' to {stats_file}")
@@ -108,7 +236,7 @@ class UploadCache:
             logger.error(f"Failed to save stats file {stats_file}: {e}")
             return None
 
-        del self.current_stats[object_name]
+        del self.current_stats[stats_key]
         return stats_file
 
     def get_object_stats(self, object_name: str) -> dict:
@@ -126,73 +254,169 @@ class UploadCache:
                 except TypeError:
                     dst[key] = value
 
-    def add_usage_item(self, bucket: str, user_id: str, counters: dict):
+    def enable_usage_series(self, period_seconds: int, slots: int):
+        """
+        Splits every usage period into `slots` slots of period_seconds // slots seconds.
+        """
+        period_seconds, slots = int(period_seconds), int(slots)
+        if period_seconds <= 0 or slots <= 0:
+            raise ValueError(f"S3_USAGE_PERIOD and S3_USAGE_SLOTS must be positive, got {period_seconds} and {slots}")
+        if period_seconds % slots:
+            raise ValueError(f"S3_USAGE_PERIOD={period_seconds} is not divisible by S3_USAGE_SLOTS={slots}")
+
+        self.series_slots = slots
+        self.series_slot_seconds = period_seconds // slots
+        if self.usage_series is None:
+            self.usage_series = {}
+
+    def add_usage_item(self,
+                       bucket: str,
+                       user_id: str,
+                       counters: dict,
+                       cluster: Optional[str] = None,
+                       timestamp: Optional[datetime] = None):
         key = (bucket, user_id)
         if key not in self.usage_aggregate:
             self.usage_aggregate[key] = json.loads(json.dumps(counters))
         else:
             self._merge_counters(self.usage_aggregate[key], counters)
 
+        if cluster is not None:
+            per_cluster = self.usage_clusters.setdefault(key, {})
+            if cluster not in per_cluster:
+                per_cluster[cluster] = json.loads(json.dumps(counters))
+            else:
+                self._merge_counters(per_cluster[cluster], counters)
+
+        if self.query_index is not None:
+            self.query_index.add(bucket, user_id, counters)
+
+        if self.usage_series is not None and timestamp is not None:
+            series = self.usage_series.get(key)
+            if series is None:
+                series = self.usage_series[key] = UsageSeries(self.series_slot_seconds, self.series_slots)
+            series.add(UsageSeries.slot_of(timestamp, self.series_slot_seconds), numeric_counters(counters))
+
         logger.debug(
             f"Aggregated usage for bucket='{bucket}', user_id='{user_id}' "
             f"(types: {list(counters.keys())})"
         )
 
+    def usage_row(self, bucket: str, user_id: str) -> Optional[dict]:
+        counters = self.usage_aggregate.get((bucket, user_id))
+        if counters is None:
+            return None
+
+        row = {
+            "bucket": bucket,
+            "user_id": user_id,
+            "counters": {
+                "counters": counters,
+            },
+        }
+
+        per_cluster = self.usage_clusters.get((bucket, user_id))
+        if per_cluster:
+            row["clusters"] = per_cluster
+
+        if self.usage_series is not None:
+            series = self.usage_series.get((bucket, user_id))
+            if series is not None:
+                row["series"] = series.to_dict()
+
+        return row
+
+    def iter_usage_rows(self) -> Iterator[dict]:
+        for bucket, user_id in self.usage_aggregate:
+            yield self.usage_row(bucket, user_id)
+
+    def enable_query_index(self) -> QueryIndex:
+        if self.query_index is None:
+            self.query_index = QueryIndex()
+            for (bucket, user_id), counters in self.usage_aggregate.items():
+                self.query_index.add(bucket, user_id, counters)
+
+        return self.query_index
+
+    def counter_columns(self) -> Dict[str, type]:
+        """
+        Flattened counter names of the whole aggregate with their value type (int, float or str).
+        """
+        columns: Dict[str, type] = {}
+        for counters in self.usage_aggregate.values():
+            for name, value in flatten_counters(counters).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    kind = str
+                elif isinstance(value, float):
+                    kind = float
+                else:
+                    kind = int
+
+                known = columns.get(name)
+                if known is None or known is int or kind is str:
+                    columns[name] = kind
+
+        return dict(sorted(columns.items()))
+
     def build_usage_summary(
         self,
         received_items: int = 0,
         processed_requests: int = 0,
         error: bool = False,
+        clusters: Optional[list] = None,
+        include_rows: bool = True,
     ) -> dict:
-
-        summarized_data = []
-        for (bucket, user_id), counters in self.usage_aggregate.items():
-            summarized_data.append(
-                {
-                    "bucket": bucket,
-                    "user_id": user_id,
-                    "counters": {
-                        "counters": counters,
-                    },
-                }
-            )
+        """
+        With include_rows=False summarized_data is only written to files and
+        the returned summary holds the row count in 'summarized_rows'.
+        """
 
         if processed_requests == 0 and not error:
-            result = {
-                "status": "skip",
-                "received_items": received_items,
-                "processed_requests": processed_requests,
-                "summarized_data": [],
-            }
-
+            status = "skip"
         elif error:
+            status = "error"
+        else:
+            status = "done"
 
-            result = {
-                "status": "error",
-                "received_items": received_items,
-                "processed_requests": processed_requests,
-                "summarized_data": summarized_data,
-            }
+        result = {
+            "status": status,
+            "received_items": received_items,
+            "processed_requests": processed_requests,
+        }
 
-        else:
-            result = {
-                "status": "done",
-                "received_items": received_items,
-                "processed_requests": processed_requests,
-                "summarized_data": summarized_data,
-            }
+        if clusters is not None:
+            result["clusters"] = clusters
+
+        rows_count = 0 if status == "skip" else len(self.usage_aggregate)
+
+        # Delta is computed before the backup of this run is written. A run with a failed
+        # cluster would report its rows as removed, so the delta is skipped and the index kept
+        if self.settings.save_delta and is_complete_summary(result):
+            self.save_usage_delta(result)
+        elif self.settings.save_delta and status == "done":
+            logger.warning("Some clusters failed, skip usage delta and keep the previous usage index")
 
         logger.info(
-            f"Built usage summary: buckets={len(summarized_data)}, "
+            f"Built usage summary: buckets={rows_count}, "
             f"received_items={received_items}, processed_requests={processed_requests}"
         )
 
         self.save_usage_summary_to_file(result)
 
+        if include_rows:
+            result["summarized_data"] = list(self._summary_rows(status != "skip"))
+        else:
+            result["summarized_rows"] = rows_count
+
         return result
 
     def reset_usage_aggregate(self):
         self.usage_aggregate = {}
+        self.usage_clusters = {}
+        if self.usage_series is not None:
+            self.usage_series = {}
+        if self.query_index is not None:
+            self.query_index.reset()
         logger.debug("Usage aggregate reset")
 
     def add_bucket_stats(self, bucket_name: str, bucket_data: dict):
@@ -0,0 +1,50 @@
+import re
+from datetime import datetime
+from typing import Iterator, Optional
+
+from s3_usage_collector.utils.log import logger
+
+
+TIMESTAMP_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{3})?Z)')
+
+
+def parse_timestamp_from_object_name(obj_name: str) -> Optional[datetime]:
+    """
+    Usage object names carry their UTC timestamp, e.g. ...-2024-01-01T10:00:00.000Z
+    """
+    match = TIMESTAMP_PATTERN.search(obj_name)
+
+    if not match:
+        logger.warning(f"Could not parse timestamp from object name: {obj_name}")
+        return None
+
+    timestamp_str = match.group(1)
+    try:
+        if '.' in timestamp_str:
+            dt = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S.%fZ')
+        else:
+            dt = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%SZ')
+
+        return dt
+    except ValueError as e:
+        logger.warning(f"Failed to parse timestamp '{timestamp_str}' from object '{obj_name}': {e}")
+        return None
+
+
+def iter_usage_items(data: list) -> Iterator[tuple[str, str, dict]]:
+    """
+    Yields (bucket, user_id, counters) of usage items, skipping incomplete ones.
+    """
+    for item in data:
+        key_data = item.get("key", {})
+        bucket = key_data.get("bucket")
+        user_id = key_data.get("user_id")
+
+        if not bucket or not user_id:
+            continue
+
+        counters = item.get("counters", {})
+        if not counters:
+            continue
+
+        yield bucket, user_id, counters
@@ -0,0 +1,68 @@
+from array import array
+from datetime import datetime, timezone
+from typing import Dict
+
+
+def _zeros(size: int) -> array:
+    return array('d', bytes(8 * size))
+
+
+def _number(value: float):
+    return int(value) if value.is_integer() else value
+
+
+class UsageSeries:
+    """
+    Per-slot counters of one (bucket, user_id), stored sparsely by usage period.
+
+    A period is allocated on the first object that falls into it: every flattened
+    counter gets a preallocated array('d') of `slots` values. Periods without objects
+    take no memory and are not emitted, so a key seen at the start and at the end of
+    a month-long replay holds two periods, not the whole month.
+    """
+    __slots__ = ('slot_seconds', 'slots', 'periods')
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        # Index of the first slot of a period -> {counter: array of `slots` values}
+        self.periods: Dict[int, Dict[str, array]] = {}
+
+    @staticmethod
+    def slot_of(timestamp: datetime, slot_seconds: int) -> int:
+        # Object timestamps are naive UTC
+        return int(timestamp.replace(tzinfo=timezone.utc).timestamp()) // slot_seconds
+
+    def add(self, slot: int, counters: Dict[str, float]):
+        offset = slot % self.slots
+        period = self.periods.get(slot - offset)
+        if period is None:
+            period = self.periods[slot - offset] = {}
+
+        for name, value in counters.items():
+            values = period.get(name)
+            if values is None:
+                values = period[name] = _zeros(self.slots)
+            values[offset] += value
+
+    def _start(self, period_start: int) -> str:
+        start = datetime.fromtimestamp(period_start * self.slot_seconds, tz=timezone.utc)
+        return start.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def to_dict(self) -> dict:
+        """
+        Only periods that received objects, in time order. 'rollup' holds the period sums
+        computed from the slot arrays.
+        """
+        return {
+            "slot_seconds": self.slot_seconds,
+            "period_seconds": self.slot_seconds * self.slots,
+            "periods": [
+                {
+                    "start": self._start(period_start),
+                    "counters": {name: [_number(value) for value in values] for name, values in sorted(period.items())},
+                    "rollup": {name: _number(sum(values)) for name, values in sorted(period.items())},
+                }
+                for period_start, period in sorted(self.periods.items())
+            ],
+        }